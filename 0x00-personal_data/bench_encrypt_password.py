@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Measures hash_many / verify_many throughput as the thread count grows
+"""
+import os
+import sys
+import time
+
+from encrypt_password import hash_many, verify_many
+
+PASSWORDS = 16
+
+
+def run() -> None:
+    """Prints hashes/sec and speedup for 1..cpu_count threads"""
+    passwords = ["password{}".format(i) for i in range(PASSWORDS)]
+    counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    baseline = None
+    print("{:>8} {:>10} {:>10} {:>8}".format(
+        "threads", "hash/s", "verify/s", "speedup"))
+    for workers in counts:
+        started = time.perf_counter()
+        hashed = hash_many(passwords, workers)
+        hash_rate = PASSWORDS / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        assert all(verify_many(zip(hashed, passwords), workers))
+        verify_rate = PASSWORDS / (time.perf_counter() - started)
+
+        baseline = baseline or hash_rate
+        print("{:>8} {:>10.1f} {:>10.1f} {:>7.2f}x".format(
+            workers, hash_rate, verify_rate, hash_rate / baseline))
+
+
+if __name__ == '__main__':
+    run()
+    sys.exit(0)
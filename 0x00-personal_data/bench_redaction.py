@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the redaction and logging paths of filtered_logger
+
+Each path runs over synthetic user rows for every combination of field
+count, value length and PII density. Records/sec and peak traced memory
+per record are printed, and written as JSON with --json so results can
+be compared between versions.
+"""
+from itertools import product
+from typing import Callable, Dict, List
+import argparse
+import io
+import json
+import logging
+import platform
+import random
+import string
+import sys
+import time
+import timeit
+import tracemalloc
+
+from filtered_logger import AutomatonRedactionEngine, RedactingFormatter, \
+    RedactionEngine, filter_datum, get_logger
+
+FIELD_COUNTS = (5, 50, 500)
+VALUE_LENGTHS = (8, 128)
+PII_DENSITIES = (0.2, 0.8)
+PAIRS_PER_ROW = 20
+ROWS = 500
+
+
+def make_fields(count: int) -> List[str]:
+    """Returns `count` distinct synthetic field names"""
+    rng = random.Random(count)
+    fields = set()
+    while len(fields) < count:
+        fields.add(''.join(rng.choices(string.ascii_lowercase, k=8)))
+    return sorted(fields)
+
+
+def make_rows(fields: List[str], count: int, value_length: int,
+              pii_density: float) -> List[Dict[str, str]]:
+    """Returns rows where about pii_density of the keys are redacted"""
+    rng = random.Random(len(fields) * value_length)
+    rows = []
+    for _ in range(count):
+        row = {}
+        for i in range(PAIRS_PER_ROW):
+            if rng.random() < pii_density:
+                key = rng.choice(fields)
+            else:
+                key = "column_{}".format(i)
+            row[key] = ''.join(rng.choices(string.ascii_letters,
+                                           k=value_length))
+        rows.append(row)
+    return rows
+
+
+def to_message(row: Dict[str, str]) -> str:
+    """Serializes a row the way filtered_logger.main logs it"""
+    return ''.join('{}={};'.format(k, v) for k, v in row.items())
+
+
+def make_record(msg) -> logging.LogRecord:
+    """Returns a fresh user_data INFO record"""
+    return logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                             msg, None, None)
+
+
+def capture_logger(fields: List[str], queued: bool) -> logging.Logger:
+    """Returns the user_data logger redacting fields into memory"""
+    logging.getLogger("user_data").handlers.clear()
+    logger = get_logger(queued=queued, block=True)
+    handler = logger.handlers[0]
+    if queued:
+        handler = handler.listener.handlers[0]
+    handler.setStream(io.StringIO())
+    handler.setFormatter(RedactingFormatter(fields))
+    return logger
+
+
+def make_paths(fields: List[str], rows: List[Dict[str, str]]
+               ) -> Dict[str, Callable[[], Callable[[], None]]]:
+    """Returns setup functions, each returning the workload to time"""
+    messages = [to_message(row) for row in rows]
+    regex = RedactionEngine(fields, "***", ";")
+    automaton = AutomatonRedactionEngine(fields, "***", ";")
+    formatters = {mode: RedactingFormatter(fields, mode)
+                  for mode in ('regex', 'automaton')}
+
+    def formatter_path(mode: str, structured: bool):
+        def setup():
+            formatter = formatters[mode]
+            source = rows if structured else messages
+            records = [make_record(msg) for msg in source]
+            return lambda: [formatter.format(r) for r in records]
+        return setup
+
+    def logger_path(queued: bool):
+        def setup():
+            logger = capture_logger(fields, queued)
+
+            def run():
+                for message in messages:
+                    logger.info(message)
+                if queued:
+                    logger.handlers[0].listener.stop()
+            return run
+        return setup
+
+    return {
+        'filter_datum': lambda: lambda: [
+            filter_datum(fields, "***", m, ";") for m in messages],
+        'regex_engine': lambda: lambda: [regex.redact(m) for m in messages],
+        'automaton_engine': lambda: lambda: [
+            automaton.redact(m) for m in messages],
+        'formatter_regex': formatter_path('regex', False),
+        'formatter_automaton': formatter_path('automaton', False),
+        'formatter_structured': formatter_path('regex', True),
+        'get_logger': logger_path(False),
+        'get_logger_queued': logger_path(True),
+    }
+
+
+def measure(setup: Callable[[], Callable[[], None]], records: int,
+            repeat: int) -> Dict[str, float]:
+    """Returns records/sec (best of repeat) and peak bytes per record"""
+    best = min(timeit.Timer(setup()).timeit(number=1)
+               for _ in range(repeat))
+    workload = setup()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    workload()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'records_per_sec': records / best,
+            'peak_bytes_per_record': peak / records}
+
+
+def run(rows: int = ROWS, repeat: int = 3, only: List[str] = None) -> dict:
+    """Runs every path over every scenario and returns the results"""
+    results = []
+    print("{:<22} {:>6} {:>6} {:>5} {:>12} {:>10}".format(
+        "path", "fields", "length", "pii", "records/s", "B/record"))
+    for count, length, density in product(FIELD_COUNTS, VALUE_LENGTHS,
+                                          PII_DENSITIES):
+        fields = make_fields(count)
+        data = make_rows(fields, rows, length, density)
+        for name, setup in make_paths(fields, data).items():
+            if only and name not in only:
+                continue
+            result = {'path': name, 'fields': count, 'value_length': length,
+                      'pii_density': density}
+            result.update(measure(setup, rows, repeat))
+            results.append(result)
+            print("{:<22} {:>6} {:>6} {:>5} {:>12.0f} {:>10.0f}".format(
+                name, count, length, density, result['records_per_sec'],
+                result['peak_bytes_per_record']))
+    logging.getLogger("user_data").handlers.clear()
+    return {'python': platform.python_version(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'rows': rows, 'repeat': repeat, 'results': results}
+
+
+def main(argv: List[str] = None) -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Redaction benchmarks")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--path', action='append',
+                        help="only run this path (repeatable)")
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, args.repeat, args.path)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
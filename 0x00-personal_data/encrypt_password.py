@@ -2,6 +2,9 @@
 """
 Encrypting passwords with bcrypt
 """
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Iterable, List, Tuple
+import asyncio
 import bcrypt
 
 
@@ -20,3 +23,46 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     if bcrypt.checkpw(encoded, hashed_password):
         valid = True
     return valid
+
+
+def _verify_pair(pair: Tuple[bytes, str]) -> bool:
+    """ is_valid over a (hashed_password, password) pair """
+    return is_valid(*pair)
+
+
+def hash_many(passwords: Iterable[str], workers: int = None,
+              executor: Executor = None) -> List[bytes]:
+    """ Hashes passwords across a thread pool, keeping their order
+
+    bcrypt releases the GIL while hashing, so threads scale with cores.
+    An existing executor is used as is; otherwise one with `workers`
+    threads is created for the call.
+    """
+    if executor is not None:
+        return list(executor.map(hash_password, passwords))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hash_password, passwords))
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]], workers: int = None,
+                executor: Executor = None) -> List[bool]:
+    """ Checks (hashed_password, password) pairs across a thread pool """
+    if executor is not None:
+        return list(executor.map(_verify_pair, pairs))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_verify_pair, pairs))
+
+
+async def hash_password_async(password: str,
+                              executor: Executor = None) -> bytes:
+    """ hash_password run in an executor (the loop default if None) """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, hash_password, password)
+
+
+async def is_valid_async(hashed_password: bytes, password: str,
+                         executor: Executor = None) -> bool:
+    """ is_valid run in an executor (the loop default if None) """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, is_valid,
+                                      hashed_password, password)
@@ -2,33 +2,289 @@
 """
 Module for handling Personal Data
 """
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, List, Mapping, Sequence, Tuple
+import atexit
+import copy
+import json
+import queue
 import re
 import logging
+import os
+import shutil
+import threading
+import time
 from os import getenv
 import sys
 import mysql.connector
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+ENGINE_CACHE_SIZE = 128
+QUEUE_SIZE = 10000
+EXPORT_BATCH_SIZE = 1000
+SHARDS_PER_WORKER = 4
+POOL_SIZE = 5
+POOL_IDLE_TIMEOUT = 300
+_TERMINAL = ""
+
+
+class RedactionEngine:
+    """Redacts `field=value<separator>` pairs with a pattern compiled once"""
+
+    def __init__(self, fields: Sequence[str], redaction: str,
+                 separator: str):
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self._pattern = re.compile('({})=.*?{}'.format(
+            '|'.join(re.escape(f) for f in self.fields),
+            re.escape(separator)))
+        self._replacement = '\\1={}{}'.format(
+            redaction.replace('\\', '\\\\'),
+            separator.replace('\\', '\\\\'))
+
+    def redact(self, message: str) -> str:
+        """Returns message with every configured field value redacted"""
+        if not self.fields:
+            return message
+        return self._pattern.sub(self._replacement, message)
+
+
+class AutomatonRedactionEngine:
+    """Redacts `field=value<separator>` pairs with a multi-pattern automaton
+
+    Every pattern ends on `=`, so the automaton is a trie of the reversed
+    field names entered at each `=` the scan finds. Cost is linear in the
+    message length whatever the number of configured fields, and the
+    output matches RedactionEngine for the same arguments.
+    """
+
+    def __init__(self, fields: Sequence[str], redaction: str,
+                 separator: str):
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self._trie: dict = {}
+        for field in self.fields:
+            if not field or '=' in field:
+                raise ValueError("Invalid field name: {!r}".format(field))
+            node = self._trie
+            for char in reversed(field):
+                node = node.setdefault(char, {})
+            node[_TERMINAL] = True
+
+    def _key_start(self, message: str, equal: int, lower: int) -> int:
+        """Returns where the longest field ending at `equal` starts, or -1"""
+        node = self._trie
+        found = -1
+        i = equal - 1
+        while i >= lower:
+            node = node.get(message[i])
+            if node is None:
+                break
+            if _TERMINAL in node:
+                found = i
+            i -= 1
+        return found
+
+    def redact(self, message: str) -> str:
+        """Returns message with every configured field value redacted"""
+        if not self.fields:
+            return message
+        separator = self.separator
+        parts = []
+        emitted = 0
+        equal = message.find('=')
+        while equal != -1:
+            if self._key_start(message, equal, emitted) != -1:
+                end = message.find(separator, equal + 1)
+                if end == -1:
+                    break
+                if message.find('\n', equal + 1, end) == -1:
+                    parts.append(message[emitted:equal + 1])
+                    parts.append(self.redaction)
+                    parts.append(separator)
+                    emitted = end + len(separator)
+                    equal = message.find('=', emitted)
+                    continue
+            equal = message.find('=', equal + 1)
+        if not parts:
+            return message
+        parts.append(message[emitted:])
+        return ''.join(parts)
+
+
+REDACTION_ENGINES = {
+    'regex': RedactionEngine,
+    'automaton': AutomatonRedactionEngine,
+}
+
+
+@lru_cache(maxsize=ENGINE_CACHE_SIZE)
+def _cached_engine(fields: Tuple[str, ...], redaction: str,
+                   separator: str, mode: str):
+    """Builds one engine per (fields, redaction, separator, mode) key"""
+    return REDACTION_ENGINES[mode](fields, redaction, separator)
+
+
+def get_redaction_engine(fields: Sequence[str], redaction: str,
+                         separator: str, mode: str = 'regex'):
+    """Returns a cached redaction engine, evicting least recently used
+
+    `mode` is a key of REDACTION_ENGINES: 'regex' suits a handful of
+    fields, 'automaton' keeps cost flat for hundreds of them.
+    """
+    if mode not in REDACTION_ENGINES:
+        raise ValueError("Unknown redaction mode: {}".format(mode))
+    return _cached_engine(tuple(fields), redaction, separator, mode)
+
+
+class StructuredRedactor:
+    """Redacts mappings by key lookup instead of pattern matching
+
+    A plain field name is redacted at any depth; a dotted field such as
+    "payload.card.number" only at that path from the root. Lists are
+    walked element by element. The input is never modified.
+    """
+
+    def __init__(self, fields: Sequence[str], redaction: str):
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.redaction = redaction
+        self._names = frozenset(f for f in self.fields if '.' not in f)
+        self._paths: dict = {}
+        for field in self.fields:
+            if '.' not in field:
+                continue
+            node = self._paths
+            for key in field.split('.'):
+                node = node.setdefault(key, {})
+            node[_TERMINAL] = True
+
+    def redact(self, payload):
+        """Returns a redacted copy of payload"""
+        return self._redact(payload, [self._paths] if self._paths else [])
+
+    def _redact(self, value, nodes: list):
+        """Redacts value given the path-trie nodes reaching it"""
+        if isinstance(value, Mapping):
+            result = {}
+            for key, item in value.items():
+                children = [node[key] for node in nodes if key in node]
+                if key in self._names or \
+                        any(_TERMINAL in child for child in children):
+                    result[key] = self.redaction
+                elif self._names or children:
+                    result[key] = self._redact(item, children)
+                else:
+                    result[key] = item
+            return result
+        if isinstance(value, (list, tuple)):
+            return [self._redact(item, nodes) for item in value]
+        return value
 
 
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """Returns a log message obfuscated"""
-    return re.sub(f'({"|".join(fields)})=.*?{separator}',
-                  f'\\1={redaction}{separator}', message)
+    return get_redaction_engine(fields, redaction, separator).redact(message)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler over a bounded queue that drops or blocks when full
 
+    Records are handed over unformatted so redaction runs on the
+    QueueListener thread. `enqueued` and `dropped` count records.
+    """
+
+    def __init__(self, record_queue: queue.Queue, block: bool = False,
+                 timeout: float = None):
+        super().__init__(record_queue)
+        self.block = block
+        self.timeout = timeout
+        self.enqueued = 0
+        self.dropped = 0
+        self.listener = None
+        self._counter_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merges the arguments into the message, leaving it unredacted"""
+        record = copy.copy(record)
+        if not isinstance(record.msg, Mapping):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        """Queues the record, counting it as dropped if the queue is full"""
+        try:
+            self.queue.put(record, block=self.block, timeout=self.timeout)
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped += 1
+            return
+        with self._counter_lock:
+            self.enqueued += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """QueueListener whose stop() waits for room and may be called twice"""
+
+    def enqueue_sentinel(self):
+        """Blocks until the stop sentinel fits behind pending records"""
+        self.queue.put(self._sentinel)
 
-def get_logger() -> logging.Logger:
-    """Returns a Logger Object"""
+    def stop(self):
+        """Writes out pending records and stops the worker thread"""
+        if self._thread is not None:
+            super().stop()
+
+
+def get_logger(queued: bool = False, queue_size: int = QUEUE_SIZE,
+               block: bool = False) -> logging.Logger:
+    """Returns a Logger Object
+
+    With `queued`, callers only enqueue records; a QueueListener thread
+    redacts and writes them. When `queue_size` records are pending, new
+    ones are dropped, or the caller waits if `block` is set.
+    """
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(RedactingFormatter(list(PII_FIELDS)))
-    logger.addHandler(stream_handler)
+    if not queued:
+        logger.addHandler(stream_handler)
+        return logger
+
+    queue_handler = BoundedQueueHandler(queue.Queue(queue_size), block)
+    queue_handler.listener = DrainingQueueListener(
+        queue_handler.queue, stream_handler, respect_handler_level=True)
+    queue_handler.listener.start()
+    atexit.register(queue_handler.listener.stop)
+    logger.addHandler(queue_handler)
+
+    return logger
 
+
+def get_export_logger() -> logging.Logger:
+    """Returns the logger of rows that are redacted before logging
+
+    Its handler formats records as is, so only callers that redact
+    their own messages, such as LogSink, should use it. Lines are
+    labelled user_data, like those of get_logger().
+    """
+    logger = logging.getLogger("user_data.export")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(
+            RedactingFormatter.FORMAT.replace("%(name)s", "user_data")))
+        logger.addHandler(stream_handler)
     return logger
 
 
@@ -51,24 +307,374 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     return mysql.connector.Connect(**db_config)
 
 
+class PooledConnection:
+    """Connection checked out of a ConnectionPool
+
+    Behaves like the wrapped connection; close() hands it back to the
+    pool instead of closing it.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name: str):
+        if self._connection is None:
+            raise AttributeError("Connection already returned to the pool")
+        return getattr(self._connection, name)
+
+    def __enter__(self) -> 'PooledConnection':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Returns the connection to its pool"""
+        if self._connection is not None:
+            self._pool.release(self._connection)
+            self._connection = None
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections built by `connect`
+
+    Idle connections older than `idle_timeout` seconds are closed, and
+    every checkout runs a health check. `connect` defaults to get_db;
+    partial(sqlite3.connect, path, check_same_thread=False) gives a
+    local stand-in with the same interface.
+    """
+
+    def __init__(self, connect: Callable = None, size: int = POOL_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self._connect = connect if connect is not None else get_db
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._counters = {'created': 0, 'reused': 0, 'discarded': 0,
+                          'timeouts': 0}
+
+    def _count(self, name: str):
+        """Increments one of the pool counters"""
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def _healthy(connection) -> bool:
+        """Returns True if the connection still answers"""
+        try:
+            if hasattr(connection, 'is_connected'):
+                return connection.is_connected()
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1;")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        """Closes a connection that leaves the pool"""
+        self._count('discarded')
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _pop_idle(self):
+        """Returns the most recently released live connection, or None"""
+        while True:
+            with self._lock:
+                deadline = time.monotonic() - self.idle_timeout
+                expired = []
+                while self._idle and self._idle[0][1] < deadline:
+                    expired.append(self._idle.popleft()[0])
+                connection = self._idle.pop()[0] if self._idle else None
+            for stale in expired:
+                self._discard(stale)
+            if connection is None or self._healthy(connection):
+                return connection
+            self._discard(connection)
+
+    def acquire(self, timeout: float = None) -> PooledConnection:
+        """Checks out a connection, waiting up to timeout for a free slot"""
+        if not self._slots.acquire(timeout=timeout):
+            self._count('timeouts')
+            raise TimeoutError("No free connection in the pool")
+        try:
+            connection = self._pop_idle()
+            if connection is None:
+                connection = self._connect()
+                self._count('created')
+            else:
+                self._count('reused')
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return PooledConnection(self, connection)
+
+    def release(self, connection):
+        """Puts a connection back, rolling back any open transaction"""
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+        else:
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        with self._lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        """Returns pool counters plus current in-use and idle sizes"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_use'] = self._in_use
+            stats['idle'] = len(self._idle)
+        stats['size'] = self.size
+        return stats
+
+    def close(self):
+        """Closes every idle connection"""
+        with self._lock:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Returns the process-wide pool configured from the environment"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                size=int(getenv("PERSONAL_DATA_DB_POOL_SIZE", POOL_SIZE)),
+                idle_timeout=float(getenv(
+                    "PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT",
+                    POOL_IDLE_TIMEOUT)))
+            atexit.register(_pool.close)
+        return _pool
+
+
+def get_pooled_db() -> PooledConnection:
+    """Returns a connection from the shared pool; close() releases it"""
+    return get_pool().acquire()
+
+
+def redaction_mask(field_names: Sequence[str],
+                   fields: Sequence[str] = PII_FIELDS) -> Tuple[bool, ...]:
+    """Returns, for each column, whether its values must be redacted"""
+    redacted = frozenset(fields)
+    return tuple(name in redacted for name in field_names)
+
+
+def redact_row(row: Sequence, mask: Sequence[bool],
+               redaction: str = "***") -> tuple:
+    """Returns row with the masked columns replaced by redaction"""
+    return tuple(redaction if hidden else value
+                 for value, hidden in zip(row, mask))
+
+
+class LogSink:
+    """Writes redacted rows as `field=value;` messages to a logger
+
+    The rows are redacted by export_users, so the default logger is
+    get_export_logger(), which does not redact them a second time.
+    """
+
+    def __init__(self, logger: logging.Logger = None):
+        self.logger = logger if logger is not None \
+            else get_export_logger()
+
+    def write_batch(self, field_names: Sequence[str], rows: List[tuple]):
+        """Logs one message per row, already redacted"""
+        for row in rows:
+            message = '; '.join(f'{f}={r}' for f, r in zip(field_names, row))
+            self.logger.info(message + ';')
+
+    def close(self):
+        """Nothing to release"""
+
+
+class NDJSONSink:
+    """Writes redacted rows as one JSON object per line"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = open(file_path, 'w')
+
+    def write_batch(self, field_names: Sequence[str], rows: List[tuple]):
+        """Writes the whole batch in a single call"""
+        self._file.write(''.join(
+            json.dumps(dict(zip(field_names, row)), default=str) + '\n'
+            for row in rows))
+
+    def close(self):
+        """Closes the output file"""
+        self._file.close()
+
+
+def export_users(db, sinks: List, batch_size: int = EXPORT_BATCH_SIZE,
+                 query: str = "SELECT * FROM users;") -> int:
+    """Streams the rows of query to every sink, redacting PII columns
+
+    Rows are read `batch_size` at a time from an unbuffered cursor, so
+    memory stays flat; db may be any DB-API connection (e.g. sqlite3).
+    Returns the number of rows exported.
+    """
+    try:
+        cursor = db.cursor(buffered=False)
+    except TypeError:
+        cursor = db.cursor()
+    try:
+        cursor.execute(query)
+        field_names = [i[0] for i in cursor.description]
+        mask = redaction_mask(field_names)
+        redaction = RedactingFormatter.REDACTION
+        count = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            rows = [redact_row(row, mask, redaction) for row in rows]
+            for sink in sinks:
+                sink.write_batch(field_names, rows)
+            count += len(rows)
+    finally:
+        cursor.close()
+    return count
+
+
+def key_ranges(low: int, high: int, shards: int) -> List[Tuple[int, int]]:
+    """Splits [low, high] into at most `shards` half-open ranges"""
+    step = max(1, -(-(high - low + 1) // shards))
+    return [(start, min(start + step, high + 1))
+            for start in range(low, high + 1, step)]
+
+
+_worker_pool = None
+
+
+def _init_export_worker(connect: Callable):
+    """Gives each export worker process its own one-connection pool"""
+    global _worker_pool
+    _worker_pool = ConnectionPool(connect, size=1)
+
+
+def _export_range(connect: Callable, key: str, low: int, high: int,
+                  file_path: str, batch_size: int) -> int:
+    """Exports rows with low <= key < high to file_path as NDJSON"""
+    if _worker_pool is None:
+        _init_export_worker(connect)
+    db = _worker_pool.acquire()
+    sink = NDJSONSink(file_path)
+    try:
+        query = "SELECT * FROM users WHERE {0} >= {1} AND {0} < {2} " \
+                "ORDER BY {0};".format(key, int(low), int(high))
+        return export_users(db, [sink], batch_size, query)
+    finally:
+        sink.close()
+        db.close()
+
+
+def parallel_export(file_path: str, workers: int = None,
+                    connect: Callable = None, key: str = "id",
+                    batch_size: int = EXPORT_BATCH_SIZE,
+                    merge: bool = True) -> int:
+    """Exports users as NDJSON over key ranges in a process pool
+
+    Each worker process keeps one pooled connection from `connect`
+    (get_db by default; any picklable factory such as
+    partial(sqlite3.connect, path) works) and reuses it across its
+    ranges, which are redacted in the worker. Shards are written to
+    `<file_path>.<n>` and, with `merge`, concatenated in key order into
+    file_path. Returns the number of rows exported. `key` must be an
+    integer column of users.
+    """
+    if not key.isidentifier():
+        raise ValueError("Invalid key column: {}".format(key))
+    connect = connect if connect is not None else get_db
+    workers = workers or os.cpu_count() or 1
+
+    db = connect()
+    try:
+        cursor = db.cursor()
+        cursor.execute("SELECT * FROM users LIMIT 0;")
+        cursor.fetchall()
+        if key not in [column[0] for column in cursor.description]:
+            raise ValueError("Unknown key column: {}".format(key))
+        cursor.execute("SELECT MIN({0}), MAX({0}) FROM users;".format(key))
+        low, high = cursor.fetchone()
+        cursor.close()
+    finally:
+        db.close()
+    if low is None:
+        open(file_path, 'w').close()
+        return 0
+    if type(low) is not int or type(high) is not int:
+        raise ValueError("Key column {} is not an integer column"
+                         .format(key))
+
+    ranges = key_ranges(int(low), int(high), workers * SHARDS_PER_WORKER)
+    shard_paths = ["{}.{:04d}".format(file_path, n)
+                   for n in range(len(ranges))]
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_export_worker,
+                             initargs=(connect,)) as executor:
+        futures = [executor.submit(_export_range, connect, key, start, end,
+                                   shard_path, batch_size)
+                   for (start, end), shard_path in zip(ranges, shard_paths)]
+        count = sum(future.result() for future in futures)
+
+    if merge:
+        with open(file_path, 'wb') as output:
+            for shard_path in shard_paths:
+                with open(shard_path, 'rb') as shard:
+                    shutil.copyfileobj(shard, output)
+                os.remove(shard_path)
+    return count
+
+
 def main():
     """
-    Obtain a database connection using get_db and retrieves all rows
+    Obtain a database connection from the pool and retrieves all rows
     in the users table and display each row under a filtered format
     """
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM users;")
-    field_names = [i[0] for i in cursor.description]
+    batch_size = int(getenv("PERSONAL_DATA_EXPORT_BATCH_SIZE",
+                            EXPORT_BATCH_SIZE))
+    ndjson_path = getenv("PERSONAL_DATA_EXPORT_NDJSON")
+    workers = int(getenv("PERSONAL_DATA_EXPORT_WORKERS", 1))
+    key = getenv("PERSONAL_DATA_EXPORT_KEY", "id")
 
-    logger = get_logger()
+    if workers > 1:
+        if not ndjson_path:
+            raise ValueError("PERSONAL_DATA_EXPORT_WORKERS needs "
+                             "PERSONAL_DATA_EXPORT_NDJSON.")
+        parallel_export(ndjson_path, workers, key=key, batch_size=batch_size)
+        return
 
-    for row in cursor:
-        str_row = ''.join(f'{f}={str(r)}; ' for r, f in zip(row, field_names))
-        logger.info(str_row.strip())
+    sinks = [LogSink()]
+    if ndjson_path:
+        sinks.append(NDJSONSink(ndjson_path))
 
-    cursor.close()
-    db.close()
+    db = get_pooled_db()
+    try:
+        export_users(db, sinks, batch_size)
+    finally:
+        for sink in sinks:
+            sink.close()
+        db.close()
 
 
 class RedactingFormatter(logging.Formatter):
@@ -78,14 +684,29 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], mode: str = 'regex'):
         super().__init__(self.FORMAT)
         self.fields = fields
+        self._engine = get_redaction_engine(fields, self.REDACTION,
+                                            self.SEPARATOR, mode)
+        self._structured = StructuredRedactor(fields, self.REDACTION)
 
     def format(self, record: logging.LogRecord) -> str:
-        """Filters values in incoming log records using filter_datum"""
-        record.msg = filter_datum(self.fields, self.REDACTION,
-                                  record.getMessage(), self.SEPARATOR)
+        """Filters values in incoming log records using filter_datum
+
+        A dict message, or a dict passed as `extra={'data': ...}`, is
+        redacted by key and serialized once as JSON.
+        """
+        if isinstance(record.msg, Mapping):
+            record.msg = json.dumps(self._structured.redact(record.msg),
+                                    default=str)
+        else:
+            record.msg = self._engine.redact(record.getMessage())
+            data = getattr(record, 'data', None)
+            if isinstance(data, Mapping):
+                record.msg = "{} {}".format(record.msg, json.dumps(
+                    self._structured.redact(data), default=str))
+        record.args = None
         return super().format(record)
 
 
@@ -3,6 +3,7 @@
 Route module for the API
 """
 from os import getenv
+from api.v1.auth.path_matcher import ExcludedPathMatcher
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -13,6 +14,11 @@ app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
 AUTH_TYPE = getenv("AUTH_TYPE")
+EXCLUDED_PATHS = ExcludedPathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/'
+])
 
 if AUTH_TYPE == "auth":
     from api.v1.auth.auth import Auth
@@ -29,12 +35,7 @@ def filter_request() -> str:
     if auth is None:
         return
 
-    excluded_paths = [
-        '/api/v1/status/',
-        '/api/v1/unauthorized/',
-        '/api/v1/forbidden/'
-    ]
-    if not auth.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
 
     if auth.authorization_header(request) is None:
@@ -2,6 +2,8 @@
 """Used to handle authetication"""
 from typing import List, TypeVar
 from flask import request
+from api.v1.auth.path_matcher import ExcludedPathMatcher, \
+    compile_excluded_paths
 
 
 class Auth:
@@ -12,7 +14,7 @@ class Auth:
         Args:
             path (str): The path to check.
             excluded_paths (List[str]): A list of paths to
-            exclude from authentication.
+            exclude from authentication, or an ExcludedPathMatcher.
         Returns:
             bool: True if authentication is required, False otherwise.
         """
@@ -20,20 +22,12 @@ class Auth:
             return True
         if excluded_paths is None or len(excluded_paths) == 0:
             return True
+        if not isinstance(excluded_paths, ExcludedPathMatcher):
+            excluded_paths = compile_excluded_paths(tuple(excluded_paths))
         if path[-1] != '/':
             path += '/'
 
-        for excluded_path in excluded_paths:
-            if excluded_path.endswith('*'):
-                # Remove the wildcard character
-                base_excluded_path = excluded_path[:-1]
-                if path.startswith(base_excluded_path):
-                    return False
-            else:
-                if path == excluded_path:
-                    return False
-
-        return True
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """Authorization header"""
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 """Module to handle basic auth"""
 from api.v1.auth.auth import Auth
+from api.v1.auth.credential_cache import CredentialCache
 from base64 import b64decode
 from models.user import User
 
 
 class BasicAuth(Auth):
     """Basic Auth class"""
+    def __init__(self):
+        """Initialize Basic Authentication"""
+        self.credential_cache = CredentialCache()
+
     def extract_base64_authorization_header(self,
                                             authorization_header: str) -> str:
         """Extract base64 authorization header"""
@@ -51,20 +56,30 @@ class BasicAuth(Auth):
         if user_pwd is None or not isinstance(user_pwd, str):
             return None
         try:
-            users = User.search({'email': user_email})
+            for user in User.query({'email': user_email}):
+                if user.is_valid_password(user_pwd):
+                    return user
         except Exception:
             return None
-        for user in users:
-            if user.is_valid_password(user_pwd):
-                return user
         return None
 
     def current_user(self, request=None) -> type:
-        """Current user"""
+        """Current user
+
+        Headers already verified are answered from credential_cache.
+        """
         auth_header = self.authorization_header(request)
+        if auth_header is None or not isinstance(auth_header, str):
+            return None
+        user = self.credential_cache.get(auth_header)
+        if user is not None:
+            return user
         b64_auth_header = self.extract_base64_authorization_header(auth_header)
         decoded_auth_header = self.decode_base64_authorization_header(
             b64_auth_header)
         user_email, user_pwd = self.extract_user_credentials(
             decoded_auth_header)
-        return self.user_object_from_credentials(user_email, user_pwd)
+        user = self.user_object_from_credentials(user_email, user_pwd)
+        if user is not None:
+            self.credential_cache.put(auth_header, user)
+        return user
@@ -2,18 +2,136 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from flask import Response, abort, jsonify, request
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
 from models.user import User
+import hashlib
+import json
+
+STREAM_BATCH_SIZE = 100
+
+
+def _encode_cursor(key: Tuple[str, str]) -> str:
+    """ Opaque cursor of a (created_at, id) pair
+    """
+    return urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    """ (created_at, id) pair of a cursor, None if it is invalid
+    """
+    try:
+        key = json.loads(urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        return None
+    if type(key) is not list or len(key) != 2 \
+            or not all(type(value) is str for value in key):
+        return None
+    return tuple(key)
+
+
+def _not_modified(etag: str) -> Response:
+    """ 304 response for a matching If-None-Match
+    """
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def _user_response(user: User, status: int = 200) -> Response:
+    """ JSON response of one user, from its cached JSON text, with a
+    digest of that text as ETag; 304 for a GET that already has it
+    """
+    text = user.to_json_str()
+    etag = hashlib.sha1(text.encode()).hexdigest()
+    if request.method == 'GET' and request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    response = Response(text, status, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
+def _list_response(users: Iterable[User]) -> Response:
+    """ JSON response of a list of users, from their cached JSON texts
+    """
+    return Response('[' + ','.join(user.to_json_str() for user in users)
+                    + ']', mimetype='application/json')
+
+
+def _stream_json_list(users: Iterable[User]) -> Iterator[str]:
+    """ JSON list of users, STREAM_BATCH_SIZE users per chunk
+    """
+    yield '['
+    separator = ''
+    batch = []
+    for user in users:
+        batch.append(separator + user.to_json_str())
+        separator = ','
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield ''.join(batch)
+            batch = []
+    yield ''.join(batch) + ']'
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (all optional):
+      - limit: maximum number of users to return
+      - cursor: X-Next-Cursor header of the previous page
+      - stream: 1 to stream the list while it is serialized
     Return:
-      - list of all User objects JSON represented
+      - list of User objects JSON represented, ordered by created_at
+        and id when paginated or streamed; the X-Next-Cursor header
+        is set when more users follow. The ETag is the User.version()
+        of the store, so If-None-Match gets a 304 until a user changes
+      - 400 if limit or cursor is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    stream = request.args.get('stream') == '1'
+    after = None
+    if cursor is not None:
+        after = _decode_cursor(cursor)
+        if after is None:
+            return jsonify({'error': "Wrong cursor"}), 400
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({'error': "Wrong limit"}), 400
+
+    etag = User.version()
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    if limit is None and cursor is None and not stream:
+        response = _list_response(User.all())
+        response.set_etag(etag)
+        return response
+
+    keys = User.ordered_ids(after)
+    next_cursor = None
+    if limit is not None:
+        keys = list(islice(keys, limit + 1))
+        if len(keys) > limit:
+            keys = keys[:limit]
+            next_cursor = _encode_cursor(keys[-1])
+
+    users = (user for user in (User.get(obj_id) for _, obj_id in keys)
+             if user is not None)
+    if stream:
+        response = Response(_stream_json_list(users),
+                            mimetype='application/json')
+    else:
+        response = _list_response(users)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    response.set_etag(etag)
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -30,7 +148,7 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return _user_response(user)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -83,7 +201,7 @@ def create_user() -> str:
             user.first_name = rj.get("first_name")
             user.last_name = rj.get("last_name")
             user.save()
-            return jsonify(user.to_json()), 201
+            return _user_response(user, 201)
         except Exception as e:
             error_msg = "Can't create User: {}".format(e)
     return jsonify({'error': error_msg}), 400
@@ -119,4 +237,126 @@ def update_user(user_id: str = None) -> str:
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
     user.save()
-    return jsonify(user.to_json()), 200
+    return _user_response(user)
+
+
+def _bulk_items() -> list:
+    """ JSON list body of a bulk request, None if it is not a list
+    """
+    try:
+        rj = request.get_json()
+    except Exception:
+        return None
+    return rj if type(rj) is list else None
+
+
+def _bulk_response(users: List[User], errors: List[dict],
+                   status: int = 200) -> Response:
+    """ JSON response of a bulk request: the users it changed and the
+    errors of the items it skipped
+    """
+    return Response('{"users":[' + ','.join(user.to_json_str()
+                                            for user in users)
+                    + '],"errors":' + json.dumps(errors) + '}', status,
+                    mimetype='application/json')
+
+
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+def create_users() -> str:
+    """ POST /api/v1/users/bulk
+    JSON body:
+      - list of users, each as for POST /api/v1/users
+    Return:
+      - created User objects JSON represented, and the errors of the
+        items not created (with their index in the list); all users
+        are saved in one step
+      - 400 if the body is not a list or no user was created
+    """
+    items = _bulk_items()
+    if items is None:
+        return jsonify({'error': "Wrong format"}), 400
+    users = []
+    errors = []
+    for index, rj in enumerate(items):
+        if type(rj) is not dict:
+            error_msg = "Wrong format"
+        elif rj.get("email", "") == "":
+            error_msg = "email missing"
+        elif rj.get("password", "") == "":
+            error_msg = "password missing"
+        else:
+            try:
+                user = User()
+                user.email = rj.get("email")
+                user.password = rj.get("password")
+                user.first_name = rj.get("first_name")
+                user.last_name = rj.get("last_name")
+                users.append(user)
+                continue
+            except Exception as e:
+                error_msg = "Can't create User: {}".format(e)
+        errors.append({'index': index, 'error': error_msg})
+    if len(users) == 0:
+        return _bulk_response(users, errors, 400)
+    User.save_many(users)
+    return _bulk_response(users, errors, 201)
+
+
+@app_views.route('/users/bulk', methods=['PUT'], strict_slashes=False)
+def update_users() -> str:
+    """ PUT /api/v1/users/bulk
+    JSON body:
+      - list of {id, last_name (optional), first_name (optional)}
+    Return:
+      - updated User objects JSON represented, and the errors of the
+        items not applied; all users are saved in one step
+      - 400 if the body is not a list
+    """
+    items = _bulk_items()
+    if items is None:
+        return jsonify({'error': "Wrong format"}), 400
+    users = []
+    changes = []
+    errors = []
+    for index, rj in enumerate(items):
+        user = None
+        if type(rj) is not dict:
+            error_msg = "Wrong format"
+        else:
+            if type(rj.get('id')) is str:
+                user = User.get(rj.get('id'))
+            error_msg = "User not found"
+        if user is None:
+            errors.append({'index': index, 'error': error_msg})
+            continue
+        users.append(user)
+        changes.append({attr: rj.get(attr)
+                        for attr in ('first_name', 'last_name')
+                        if rj.get(attr) is not None})
+    User.save_many(users, changes)
+    return _bulk_response(users, errors)
+
+
+@app_views.route('/users/bulk', methods=['DELETE'], strict_slashes=False)
+def delete_users() -> str:
+    """ DELETE /api/v1/users/bulk
+    JSON body:
+      - list of User IDs
+    Return:
+      - IDs of the deleted users, and the errors of the items not
+        deleted; all users are removed in one step
+      - 400 if the body is not a list
+    """
+    items = _bulk_items()
+    if items is None:
+        return jsonify({'error': "Wrong format"}), 400
+    users = {}
+    errors = []
+    for index, user_id in enumerate(items):
+        user = User.get(user_id) if type(user_id) is str else None
+        if user is None:
+            errors.append({'index': index, 'error': "User not found"})
+        else:
+            users[user.id] = user
+    User.remove_many(users.values())
+    return jsonify({'deleted': list(users), 'errors': errors}), 200
@@ -2,36 +2,146 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator, Dict, Tuple
+from os import path, getenv
+from collections import OrderedDict
+from contextlib import nullcontext
+from itertools import islice
+import atexit
 import json
+import marshal
+import operator
+import os
+import sys
+import threading
+import time
 import uuid
+from models.engine import journal
+from models.engine.files import atomic_write
+from models.engine.filelock import FileLock
+from models.engine.flusher import Flusher
+from models.engine.index import HashIndex
+from models.engine.record import Layout, Record
+from models.engine.sorted_index import SortedIndex
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+TIMESTAMP_ATTRIBUTES = ('created_at', 'updated_at')
+QUERY_OPERATORS = {'eq': operator.eq, 'lt': operator.lt, 'lte': operator.le,
+                   'gt': operator.gt, 'gte': operator.ge,
+                   'prefix': str.startswith}
+PERSISTENCE = getenv("BASE_PERSISTENCE", "snapshot")
+JOURNAL_COMPACT_THRESHOLD = int(getenv("BASE_JOURNAL_COMPACT_THRESHOLD",
+                                       "1000"))
+FLUSH_INTERVAL = float(getenv("BASE_FLUSH_INTERVAL", "0"))
+FLUSH_MAX_PENDING = int(getenv("BASE_FLUSH_MAX_PENDING", "100"))
+SNAPSHOT_FORMAT = getenv("BASE_SNAPSHOT_FORMAT", "json")
+SNAPSHOT_VERSION = 1
+LAZY_LOAD = getenv("BASE_LAZY_LOAD", "1") == "1"
+COMPACT = getenv("BASE_COMPACT", "0") == "1"
+JSON_CACHE_SIZE = int(getenv("BASE_JSON_CACHE_SIZE", "100000"))
+SHARED = getenv("BASE_SHARED", "0") == "1"
 DATA = {}
+JSON_CACHE = {}
+VERSIONS = {}
+STORE_ID = uuid.uuid4().hex
+INDEXES = {}
+SORTED_INDEXES = {}
+LAYOUTS = {}
+JOURNAL_SIZES = {}
+SYNC_STATES = {}
+LOCKS = {}
+IO_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+FLUSHER = Flusher(FLUSH_INTERVAL, FLUSH_MAX_PENDING)
+
+
+def flush():
+    """ Persist every write queued by the write-behind flusher
+    """
+    FLUSHER.flush()
+
+
+atexit.register(flush)
+
+
+def _class_lock(locks: dict, s_class: str) -> threading.RLock:
+    """ Lock of s_class in locks, created on first use
+    """
+    lock = locks.get(s_class)
+    if lock is None:
+        with _LOCKS_GUARD:
+            lock = locks.setdefault(s_class, threading.RLock())
+    return lock
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string, through fromisoformat when it
+    has the exact expected shape
+    """
+    if len(value) == 19 and value[10] == 'T':
+        return datetime.fromisoformat(value)
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value) -> str:
+    """ TIMESTAMP_FORMAT string of a datetime, epoch seconds or string
+    (empty for None)
+    """
+    if type(value) is datetime:
+        return value.strftime(TIMESTAMP_FORMAT)
+    if type(value) is int:
+        return time.strftime(TIMESTAMP_FORMAT, time.gmtime(value))
+    return value or ''
 
 
 class Base():
     """ Base class
+
+    Writers of a class (save, remove, load_from_file) hold its data
+    lock while they change DATA, and its IO lock while they touch its
+    files; the IO lock is only ever taken after the data lock. Readers
+    (get, all, search, count) take no lock: they work on a copy of DATA
+    made in one step, so they never block on writers. Snapshots are
+    serialized from such a copy, and journal records appended, after
+    the data lock is released.
+
+    Readers that install a lazily loaded object or a cached JSON text
+    only try the data lock, and skip the install when a writer holds
+    it, so a read never waits.
+
+    DATA holds, per id, the object itself, its serialized dict (left by
+    a lazy load until first access) or, with COMPACT, a Record that is
+    turned into a new object on every access.
+
+    JSON_CACHE keeps, per id, the public and the full JSON text of the
+    object (see to_json_str) until its next save or removal. VERSIONS
+    counts the writes of each class; a text is only cached if no write
+    happened while it was serialized.
+
+    With SHARED, several processes can use the same files: writes hold
+    an exclusive flock on .db_<Class>.lock and are persisted right away,
+    and every read or write first picks up the changes other processes
+    made to the snapshot (a new file: full reload) or to the journal
+    (new records past the offset already read: applied incrementally).
     """
+    indexed_attributes: Tuple[str, ...] = ()
+    sorted_attributes: Tuple[str, ...] = ()
+    interned_attributes: Tuple[str, ...] = ()
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+        DATA.setdefault(s_class, {})
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -57,54 +167,577 @@ class Base():
                 result[key] = value
         return result
 
+    def to_json_str(self, for_serialization: bool = False) -> str:
+        """ to_json as JSON text, cached until the object is saved or
+        removed; the public text has sorted keys, like jsonify. Only the
+        stored object (with COMPACT, a copy equal to its record) fills
+        the cache, so detached copies never leave stale text behind.
+        """
+        s_class = self.__class__.__name__
+        slot = 1 if for_serialization else 0
+        entry = JSON_CACHE.get(s_class, {}).get(self.id)
+        if entry is not None and entry[slot] is not None:
+            return entry[slot]
+        version = VERSIONS.get(s_class, 0)
+        if for_serialization:
+            text = json.dumps(self.to_json(True))
+        else:
+            text = json.dumps(self.to_json(), sort_keys=True,
+                              separators=(',', ':'))
+        stored_as = self._layout().pack(self.to_json(True)) if COMPACT \
+            else self
+        lock = self._lock()
+        if lock.acquire(blocking=False):
+            try:
+                stored = DATA[s_class].get(self.id)
+                if VERSIONS.get(s_class, 0) == version and (
+                        stored is self or COMPACT and stored == stored_as):
+                    self._cache_json(slot, text)
+            finally:
+                lock.release()
+        return text
+
+    def _cache_json(self, slot: int, text: str):
+        """ Cache one JSON text of the object; called with the data lock
+        held
+        """
+        if JSON_CACHE_SIZE <= 0:
+            return
+        s_class = self.__class__.__name__
+        cache = JSON_CACHE.get(s_class)
+        if cache is None:
+            cache = JSON_CACHE[s_class] = OrderedDict()
+        entry = cache.get(self.id)
+        if entry is None:
+            entry = cache[self.id] = [None, None]
+            while len(cache) > JSON_CACHE_SIZE:
+                cache.popitem(last=False)
+        entry[slot] = text
+
     @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
+    def _changed(cls, obj_id: str = None):
+        """ Count a write and drop the cached JSON of obj_id (of every
+        object if None); called with the data lock held
+        """
+        s_class = cls.__name__
+        VERSIONS[s_class] = VERSIONS.get(s_class, 0) + 1
+        if obj_id is None:
+            JSON_CACHE.pop(s_class, None)
+        else:
+            JSON_CACHE.get(s_class, {}).pop(obj_id, None)
+
+    @classmethod
+    def _lock(cls) -> threading.RLock:
+        """ Data lock of the class
+        """
+        return _class_lock(LOCKS, cls.__name__)
+
+    @classmethod
+    def _io_lock(cls) -> threading.RLock:
+        """ IO lock of the class
+        """
+        return _class_lock(IO_LOCKS, cls.__name__)
+
+    @classmethod
+    def _indexes(cls) -> Dict[str, HashIndex]:
+        """ Secondary indexes of the class, by attribute name
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        indexes = INDEXES.get(s_class)
+        if indexes is None:
+            indexes = {attr: HashIndex() for attr in cls.indexed_attributes}
+            INDEXES[s_class] = indexes
+        return indexes
+
+    @classmethod
+    def _sorted_indexes(cls) -> Dict[str, SortedIndex]:
+        """ Sorted indexes of the class, by attribute name; created_at
+        always has one, for ordered_ids
+        """
+        s_class = cls.__name__
+        indexes = SORTED_INDEXES.get(s_class)
+        if indexes is None:
+            attrs = dict.fromkeys(('created_at',) + cls.sorted_attributes)
+            indexes = SORTED_INDEXES.setdefault(
+                s_class, {attr: SortedIndex() for attr in attrs})
+        return indexes
+
+    @staticmethod
+    def _sort_value(attr: str, value):
+        """ Value of attr as kept in sorted indexes: timestamps as
+        interned TIMESTAMP_FORMAT strings, None as ''
+        """
+        if attr in TIMESTAMP_ATTRIBUTES:
+            return sys.intern(format_timestamp(value))
+        return '' if value is None else value
+
+    @classmethod
+    def _layout(cls) -> Layout:
+        """ Layout of the compact records of the class
+        """
+        s_class = cls.__name__
+        layout = LAYOUTS.get(s_class)
+        if layout is None:
+            with _LOCKS_GUARD:
+                layout = LAYOUTS.setdefault(s_class, Layout(
+                    parse_timestamp, TIMESTAMP_FORMAT,
+                    interned=cls.indexed_attributes
+                    + cls.interned_attributes))
+        return layout
+
+    @classmethod
+    def _stored_value(cls, obj, attr: str):
+        """ Value of attr for anything DATA may hold
+        """
+        if type(obj) is dict:
+            return obj.get(attr)
+        if type(obj) is Record:
+            return cls._layout().value(obj, attr)
+        return getattr(obj, attr, None)
+
+    @classmethod
+    def _serialized(cls, obj_id: str, obj) -> dict:
+        """ Serialized form of anything DATA may hold
+        """
+        if type(obj) is dict:
+            return obj
+        if type(obj) is Record:
+            return cls._layout().unpack(obj, obj_id)
+        return obj.to_json(True)
+
+    @classmethod
+    def _reindex(cls):
+        """ Rebuild the secondary and sorted indexes from DATA
+        """
+        s_class = cls.__name__
+        INDEXES.pop(s_class, None)
+        SORTED_INDEXES.pop(s_class, None)
+        indexes = cls._indexes()
+        objs = DATA[s_class]
+        for obj_id, obj in objs.items():
+            for attr, index in indexes.items():
+                index.add(obj_id, cls._stored_value(obj, attr))
+        SORTED_INDEXES[s_class] = {
+            attr: SortedIndex(
+                (cls._sort_value(attr, cls._stored_value(obj, attr)), obj_id)
+                for obj_id, obj in objs.items())
+            for attr in cls._sorted_indexes()}
+
+    @classmethod
+    def _index_stored(cls, obj_id: str, obj):
+        """ Record the indexed attribute values of anything DATA may hold
+        """
+        for attr, index in cls._indexes().items():
+            index.add(obj_id, cls._stored_value(obj, attr))
+        for attr, index in cls._sorted_indexes().items():
+            index.add(obj_id, cls._sort_value(attr,
+                                              cls._stored_value(obj, attr)))
+
+    @classmethod
+    def _unindex_stored(cls, obj_id: str):
+        """ Drop obj_id from the secondary and sorted indexes
+        """
+        for index in cls._indexes().values():
+            index.discard(obj_id)
+        for index in cls._sorted_indexes().values():
+            index.discard(obj_id)
+
+    def _index(self):
+        """ Record current indexed attribute values
+        """
+        self._index_stored(self.id, self)
+
+    def _unindex(self):
+        """ Drop the object from the secondary and sorted indexes
+        """
+        self._unindex_stored(self.id)
+
+    @classmethod
+    def _journal_path(cls) -> str:
+        """ Path of the append-only journal of the class
+        """
+        return ".db_{}.journal".format(cls.__name__)
+
+    @classmethod
+    def _snapshot_paths(cls) -> Tuple[str, str]:
+        """ Paths of the JSON and marshal snapshots, preferred first
+        """
+        json_path = ".db_{}.json".format(cls.__name__)
+        marshal_path = ".db_{}.marshal".format(cls.__name__)
+        if SNAPSHOT_FORMAT == "marshal":
+            return marshal_path, json_path
+        return json_path, marshal_path
+
+    @classmethod
+    def _file_lock(cls, exclusive: bool):
+        """ Inter-process lock of the class files with SHARED, else a
+        no-op; taken before the data lock
+        """
+        if not SHARED:
+            return nullcontext()
+        return FileLock(".db_{}.lock".format(cls.__name__), exclusive)
+
+    @classmethod
+    def _file_state(cls) -> tuple:
+        """ Identity of the snapshot files and size of the journal, to
+        notice writes made by other processes
+        """
+        state = []
+        for file_path in cls._snapshot_paths():
+            try:
+                st = os.stat(file_path)
+                state.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                state.append(None)
+        try:
+            state.append(os.stat(cls._journal_path()).st_size)
+        except FileNotFoundError:
+            state.append(0)
+        return tuple(state)
+
+    @classmethod
+    def _sync(cls, locked: bool = False):
+        """ Pick up the writes of other processes (SHARED only); locked
+        tells that the caller already holds the file lock
+        """
+        if not SHARED:
             return
+        s_class = cls.__name__
+        if SYNC_STATES.get(s_class) == cls._file_state():
+            return
+        with nullcontext() if locked else cls._file_lock(False), \
+                cls._lock():
+            seen = SYNC_STATES.get(s_class)
+            state = cls._file_state()
+            if seen == state:
+                return
+            if seen is None or seen[:-1] != state[:-1] \
+                    or state[-1] < seen[-1]:
+                cls._load()
+                return
+            with cls._io_lock():
+                records = list(journal.replay(cls._journal_path(),
+                                              seen[-1]))
+                SYNC_STATES[s_class] = cls._file_state()
+                JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) \
+                    + len(records)
+            cls._apply(records)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def _synced(cls):
+        """ Record the files as written by this process (SHARED only),
+        with the file lock held
+        """
+        if SHARED:
+            with cls._lock():
+                SYNC_STATES[cls.__name__] = cls._file_state()
+
+    @classmethod
+    def _read_snapshot(cls) -> Dict[str, dict]:
+        """ Serialized objects of the snapshot, by id
+        """
+        for file_path in cls._snapshot_paths():
+            if not path.exists(file_path):
+                continue
+            if not file_path.endswith(".marshal"):
+                with open(file_path, 'r') as f:
+                    return json.load(f)
+            with open(file_path, 'rb') as f:
+                version, columns, rows = marshal.loads(f.read())
+            if version != SNAPSHOT_VERSION:
+                raise ValueError("Unsupported snapshot version: {}"
+                                 .format(version))
+            id_column = columns.index('id')
+            return {row[id_column]: dict(zip(columns, row)) for row in rows}
+        return {}
+
+    @classmethod
+    def _hydrate(cls, obj_id: str, obj) -> TypeVar('Base'):
+        """ Materialize a serialized object left in DATA by a lazy load,
+        or build a new object from a compact record
+        """
+        if type(obj) is Record:
+            return cls(**cls._layout().unpack(obj, obj_id))
+        if type(obj) is not dict:
+            return obj
+        hydrated = cls(**obj)
+        lock = cls._lock()
+        if lock.acquire(blocking=False):
+            try:
+                objs = DATA[cls.__name__]
+                if objs.get(obj_id) is obj:
+                    objs[obj_id] = hydrated
+            finally:
+                lock.release()
+        return hydrated
+
+    @classmethod
+    def _from_json(cls, obj_json: dict):
+        """ What DATA holds for an object read from file: a record with
+        COMPACT, else the serialized dict itself with LAZY_LOAD, else
+        the object
+        """
+        if COMPACT:
+            return cls._layout().pack(obj_json)
+        if LAZY_LOAD:
+            return obj_json
+        return cls(**obj_json)
+
+    @classmethod
+    def load_from_file(cls):
+        """ Load all objects from file, then replay the journal
+
+        With COMPACT, objects are stored as records; otherwise, with
+        LAZY_LOAD, they stay serialized in DATA until first accessed.
+        """
+        with cls._file_lock(False):
+            cls._load()
+
+    @classmethod
+    def _load(cls):
+        """ load_from_file, with the file lock held
+        """
+        s_class = cls.__name__
+        with cls._io_lock():
+            objs = cls._read_snapshot()
+            replayed = 0
+            for record in journal.replay(cls._journal_path()):
+                if record.get('op') == 'save':
+                    objs[record['obj']['id']] = record['obj']
+                elif record.get('op') == 'remove':
+                    objs.pop(record['id'], None)
+                replayed += 1
+            state = cls._file_state() if SHARED else None
+        if COMPACT or not LAZY_LOAD:
+            from_json = cls._from_json
+            objs = {obj_id: from_json(obj_json)
+                    for obj_id, obj_json in objs.items()}
+        with cls._lock():
+            DATA[s_class] = objs
+            JOURNAL_SIZES[s_class] = replayed
+            if SHARED:
+                SYNC_STATES[s_class] = state
+            cls._changed()
+            cls._reindex()
+
+    @classmethod
+    def _apply(cls, records: List[dict]):
+        """ Apply journal records written by another process, with the
+        data lock held
+        """
+        objs = DATA.setdefault(cls.__name__, {})
+        for record in records:
+            if record.get('op') == 'save':
+                obj_id = record['obj']['id']
+                obj = objs[obj_id] = cls._from_json(record['obj'])
+                cls._index_stored(obj_id, obj)
+            elif record.get('op') == 'remove':
+                obj_id = record['id']
+                if objs.pop(obj_id, None) is None:
+                    continue
+                cls._unindex_stored(obj_id)
+            else:
+                continue
+            cls._changed(obj_id)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
+        with cls._file_lock(True):
+            cls._sync(locked=True)
+            cls._write_snapshot()
+            cls._synced()
+
+    @classmethod
+    def _write_snapshot(cls):
+        """ Write a copy of DATA to the snapshot and drop the journal
+
+        The IO lock is taken before the data lock is released, so
+        snapshots are written in the order their copies were made and
+        no journal append can land between the write and the clear.
+        """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        io_lock = cls._io_lock()
+        with cls._lock():
+            objs = dict(DATA[s_class])
+            io_lock.acquire()
+        try:
+            cls._write_snapshot_files(objs)
+        finally:
+            io_lock.release()
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def _write_snapshot_files(cls, objs: dict):
+        """ Serialize objs to the snapshot file, with the IO lock held
+        """
+        s_class = cls.__name__
+        file_path, other_path = cls._snapshot_paths()
+        if SNAPSHOT_FORMAT == "marshal":
+            objs_json = {obj_id: cls._serialized(obj_id, obj)
+                         for obj_id, obj in objs.items()}
+            columns = list(dict.fromkeys(
+                key for obj_json in objs_json.values() for key in obj_json))
+            rows = [tuple(obj_json.get(key) for key in columns)
+                    for obj_json in objs_json.values()]
+            atomic_write(file_path,
+                         marshal.dumps((SNAPSHOT_VERSION, columns, rows)))
+        else:
+            atomic_write(file_path, cls._snapshot_json(objs))
+        if path.exists(other_path):
+            os.remove(other_path)
+        journal.clear(cls._journal_path())
+        JOURNAL_SIZES[s_class] = 0
 
-    def save(self):
-        """ Save current object
+    @classmethod
+    def _snapshot_json(cls, objs: dict) -> str:
+        """ JSON snapshot of objs, reusing their cached JSON texts
+        """
+        cache = JSON_CACHE.get(cls.__name__, {})
+        parts = []
+        for obj_id, obj in objs.items():
+            entry = cache.get(obj_id)
+            if entry is not None and entry[1] is not None:
+                text = entry[1]
+            else:
+                text = json.dumps(cls._serialized(obj_id, obj))
+            parts.append(json.dumps(obj_id) + ': ' + text)
+        return '{' + ', '.join(parts) + '}'
+
+    @classmethod
+    def _persist(cls, records: List[dict]) -> bool:
+        """ Record a mutation; called with the data lock held so records
+        keep the order of the mutations. Returns True when the caller
+        must write them with _write once it has released the data lock;
+        in journal mode the IO lock is taken here, so appends still land
+        in that order.
+        """
+        if FLUSH_INTERVAL > 0 and not SHARED:
+            FLUSHER.submit(cls, records)
+            return False
+        if PERSISTENCE == "journal":
+            cls._io_lock().acquire()
+        return True
+
+    @classmethod
+    def _append(cls, records: List[dict]) -> bool:
+        """ Append records to the journal, with the IO lock held; True
+        once it passed JOURNAL_COMPACT_THRESHOLD and should be compacted
+        """
+        s_class = cls.__name__
+        journal.append(cls._journal_path(), records)
+        JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) \
+            + len(records)
+        return JOURNAL_SIZES[s_class] >= JOURNAL_COMPACT_THRESHOLD
+
+    @classmethod
+    def _write(cls, records: List[dict], locked: bool = False):
+        """ Persist records queued by the write-behind flusher or left
+        by _persist; locked tells that the caller already took the IO
+        lock, which is released here
+        """
+        if PERSISTENCE != "journal":
+            cls._write_snapshot()
+            return
+        io_lock = cls._io_lock()
+        if not locked:
+            io_lock.acquire()
+        try:
+            compact = cls._append(records)
+        finally:
+            io_lock.release()
+        if compact:
+            cls._write_snapshot()
+
+    def _store(self) -> dict:
+        """ Put the object in DATA and the indexes, with the data lock
+        held; returns its journal record
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        obj_json = self.to_json(True)
+        if COMPACT:
+            DATA[s_class][self.id] = self._layout().pack(obj_json)
+        else:
+            DATA[s_class][self.id] = self
+        self._index()
+        self._changed(self.id)
+        self._cache_json(1, json.dumps(obj_json))
+        return {'op': 'save', 'obj': obj_json}
+
+    def _drop(self) -> dict:
+        """ Take the object out of DATA and the indexes, with the data
+        lock held; returns its journal record, None if it was not stored
+        """
+        s_class = self.__class__.__name__
+        if DATA[s_class].get(self.id) is None:
+            return None
+        del DATA[s_class][self.id]
+        self._unindex()
+        self._changed(self.id)
+        return {'op': 'remove', 'id': self.id}
+
+    def save(self):
+        """ Save current object
+        """
+        self.__class__.save_many([self])
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        self.__class__.remove_many([self])
+
+    @classmethod
+    def save_many(cls, objs: Iterable[TypeVar('Base')],
+                  changes: Iterable[dict] = None):
+        """ Save objs in one step, persisted with a single write;
+        changes, one dict of attribute values per object, are applied
+        under the data lock so readers never see them half done
+        """
+        with cls._file_lock(True):
+            cls._sync(locked=True)
+            with cls._lock():
+                if changes is not None:
+                    objs = list(objs)
+                    for obj, attrs in zip(objs, changes):
+                        for attr, value in attrs.items():
+                            setattr(obj, attr, value)
+                records = [obj._store() for obj in objs]
+                pending = len(records) > 0 and cls._persist(records)
+            if pending:
+                cls._write(records, locked=True)
+            cls._synced()
+
+    @classmethod
+    def remove_many(cls, objs: Iterable[TypeVar('Base')]) -> int:
+        """ Remove objs in one step, persisted with a single write;
+        returns how many were stored
+        """
+        with cls._file_lock(True):
+            cls._sync(locked=True)
+            with cls._lock():
+                records = [record for record
+                           in (obj._drop() for obj in objs)
+                           if record is not None]
+                pending = len(records) > 0 and cls._persist(records)
+            if pending:
+                cls._write(records, locked=True)
+            cls._synced()
+        return len(records)
+
+    @classmethod
+    def version(cls) -> str:
+        """ Token that changes on every write to the class, and on each
+        restart of the process
+        """
+        cls._sync()
+        return "{}-{}".format(STORE_ID, VERSIONS.get(cls.__name__, 0))
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
+        cls._sync()
         s_class = cls.__name__
         return len(DATA[s_class].keys())
 
@@ -114,18 +747,34 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def ordered_ids(cls, after: Tuple[str, str] = None
+                    ) -> Iterator[Tuple[str, str]]:
+        """ Yield the (created_at, id) pair of every object in that
+        order, starting after the pair after; the pairs are stable
+        across saves, so they work as pagination cursors
+        """
+        cls._sync()
+        return cls._sorted_indexes()['created_at'].iter_after(after)
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
+        cls._sync()
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return cls._hydrate(id, DATA[s_class].get(id))
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Uses a secondary index when one of the attributes has one (as
+        maintained by save/remove), otherwise scans every object.
         """
+        cls._sync()
         s_class = cls.__name__
+
         def _search(obj):
             if len(attributes) == 0:
                 return True
@@ -133,5 +782,121 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        objs = DATA[s_class]
+        hydrate = cls._hydrate
+        indexes = cls._indexes()
+        for k, v in attributes.items():
+            if k not in indexes:
+                continue
+            try:
+                ids = indexes[k].lookup(v)
+            except TypeError:
+                break
+            found = ((i, objs.get(i)) for i in ids)
+            return list(filter(_search, (hydrate(i, obj)
+                                         for i, obj in found
+                                         if obj is not None)))
+        return list(filter(_search, (hydrate(i, obj)
+                                     for i, obj in list(objs.items()))))
+
+    @classmethod
+    def query(cls, filters: dict = {}, order_by: str = None,
+              limit: int = None, offset: int = 0
+              ) -> Iterator[TypeVar('Base')]:
+        """ Lazily yield the objects matching filters
+
+        filters maps an attribute name (equality) or "<attribute>__<op>"
+        to a value, op being one of QUERY_OPERATORS (timestamps compare
+        at TIMESTAMP_FORMAT precision). order_by names an attribute, with
+        a leading '-' for descending order. Equality on an indexed
+        attribute reads its secondary index; otherwise ranges and
+        prefixes on a sorted attribute, or ordering by one, scan its
+        sorted index from the first candidate, so taking the first
+        results stops the scan early. Other orderings sort the matches
+        in memory.
+        """
+        cls._sync()
+        predicates = []
+        for key, value in filters.items():
+            attr, _, op = key.partition('__')
+            op = op or 'eq'
+            if op not in QUERY_OPERATORS:
+                raise ValueError("Unsupported filter: {}".format(key))
+            if attr in TIMESTAMP_ATTRIBUTES:
+                value = format_timestamp(value)
+            predicates.append((attr, op, value))
+        descending = order_by is not None and order_by.startswith('-')
+        order_attr = order_by[1:] if descending else order_by
+
+        ids, ordered = cls._candidates(predicates, order_attr, descending)
+        objs = DATA[cls.__name__]
+        found = (cls._hydrate(i, objs.get(i)) for i in ids)
+        matches = (obj for obj in found
+                   if obj is not None and cls._matches(obj, predicates))
+        if order_attr is not None and not ordered:
+            matches = iter(sorted(
+                matches, reverse=descending, key=lambda obj: (
+                    cls._sort_value(order_attr,
+                                    getattr(obj, order_attr, None)),
+                    obj.id)))
+        return islice(matches, offset,
+                      None if limit is None else offset + limit)
+
+    @classmethod
+    def _candidates(cls, predicates: List[tuple], order_attr: str,
+                    descending: bool) -> Tuple[Iterable[str], bool]:
+        """ Ids that may match predicates, and whether they come in the
+        order of order_attr
+        """
+        indexes = cls._indexes()
+        for attr, op, value in predicates:
+            if op == 'eq' and attr in indexes:
+                try:
+                    return indexes[attr].lookup(value), False
+                except TypeError:
+                    break
+
+        sorted_indexes = cls._sorted_indexes()
+        bounds = {}
+        for attr, op, value in predicates:
+            if attr not in sorted_indexes or type(value) is not str:
+                continue
+            low, high = bounds.get(attr, (None, None))
+            if op in ('eq', 'gt', 'gte', 'prefix'):
+                low = value if low is None else max(low, value)
+            if op in ('eq', 'lt', 'lte'):
+                high = value if high is None else min(high, value)
+            if op == 'prefix':
+                prefix_high = value + '\U0010ffff'
+                high = prefix_high if high is None \
+                    else min(high, prefix_high)
+            bounds[attr] = (low, high)
+        if order_attr in sorted_indexes \
+                and (order_attr in bounds or not bounds):
+            low, high = bounds.get(order_attr, (None, None))
+            index = sorted_indexes[order_attr]
+            entries = index.iter_range(low, high, descending)
+            return (obj_id for _, obj_id in entries), True
+        for attr, (low, high) in bounds.items():
+            entries = sorted_indexes[attr].iter_range(low, high)
+            return (obj_id for _, obj_id in entries), order_attr is None
+        return list(DATA[cls.__name__]), order_attr is None
+
+    @classmethod
+    def _matches(cls, obj: TypeVar('Base'), predicates: List[tuple]
+                 ) -> bool:
+        """ True if obj satisfies every (attribute, op, value) predicate
+        """
+        for attr, op, value in predicates:
+            actual = getattr(obj, attr, None)
+            if op != 'eq' or attr in TIMESTAMP_ATTRIBUTES:
+                if actual is None:
+                    return False
+                actual = cls._sort_value(attr, actual)
+            if op == 'prefix' and (type(actual) is not str
+                                   or type(value) is not str):
+                return False
+            if not QUERY_OPERATORS[op](actual, value):
+                return False
+        return True
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Inter-process file lock module
+"""
+import os
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock:
+    """
+    flock(2) lock on a lock file, shared or exclusive
+
+    Each acquisition opens its own descriptor, so the lock also excludes
+    other threads of the same process. Not reentrant.
+    """
+
+    def __init__(self, file_path: str, exclusive: bool = True):
+        """
+        Initialize a lock on file_path, created on first use
+        """
+        self.file_path = file_path
+        self.exclusive = exclusive
+        self._fd = None
+
+    def __enter__(self) -> 'FileLock':
+        """
+        Block until the lock is held
+        """
+        if fcntl is None:
+            raise RuntimeError("File locking needs fcntl (POSIX only)")
+        fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if self.exclusive
+                        else fcntl.LOCK_SH)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Release the lock
+        """
+        fd, self._fd = self._fd, None
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
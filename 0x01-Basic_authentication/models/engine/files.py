@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+File helpers module
+"""
+from os import path
+import os
+
+
+def atomic_write(file_path: str, content) -> None:
+    """
+    Write content to a temporary file next to file_path, sync it and
+    rename it over file_path, so readers and crashes only ever see the
+    old or the new content (str or bytes); file_path keeps its mode, and
+    a new file gets 0666 less the umask
+    """
+    directory = path.dirname(path.abspath(file_path))
+    tmp_path = path.join(directory, "{}.{}".format(
+        path.basename(file_path), os.urandom(8).hex()))
+    fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(content, bytes) else 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, os.stat(file_path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
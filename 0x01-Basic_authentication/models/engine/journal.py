@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Append-only journal module
+"""
+from os import path
+from typing import Iterator, List
+import json
+import os
+
+
+def append(file_path: str, records: List[dict]) -> None:
+    """
+    Append records to the journal, one JSON document per line
+    """
+    if not records:
+        return
+    lines = ''.join(json.dumps(record) + '\n' for record in records)
+    with open(file_path, 'a') as f:
+        f.write(lines)
+
+
+def replay(file_path: str, offset: int = 0) -> Iterator[dict]:
+    """
+    Yield the records of the journal in write order, from the byte
+    offset of a record. A truncated or corrupt line (an interrupted
+    append) ends the journal and is cut off so later appends start on
+    a clean line.
+    """
+    if not path.exists(file_path):
+        return
+    with open(file_path, 'rb+') as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError("truncated record")
+                record = json.loads(line)
+            except ValueError:
+                f.truncate(offset)
+                return
+            offset += len(line)
+            yield record
+
+
+def clear(file_path: str) -> None:
+    """
+    Remove the journal once its records are part of the snapshot
+    """
+    if path.exists(file_path):
+        os.remove(file_path)
@@ -8,6 +8,8 @@ from models.base import Base
 class User(Base):
     """ User class
     """
+    indexed_attributes = ('email',)
+    interned_attributes = ('first_name', 'last_name')
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
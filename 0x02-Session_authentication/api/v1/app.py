@@ -3,6 +3,7 @@
 Route module for the API
 """
 from os import getenv
+from api.v1.auth.path_matcher import ExcludedPathMatcher
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS)
@@ -13,6 +14,12 @@ app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
 AUTH_TYPE = getenv("AUTH_TYPE")
+EXCLUDED_PATHS = ExcludedPathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/'
+])
 
 if AUTH_TYPE == "auth":
     from api.v1.auth.auth import Auth
@@ -35,28 +42,20 @@ elif AUTH_TYPE == "session_db_auth":
 def filter_request() -> str:
     """filter request
     """
+    request.current_user = None
     if auth is None:
         return
 
-    excluded_paths = [
-        '/api/v1/status/',
-        '/api/v1/unauthorized/',
-        '/api/v1/forbidden/',
-        '/api/v1/auth_session/login/'
-    ]
-
-    if not auth.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
 
     if auth.authorization_header(request) is None\
             and auth.session_cookie(request) is None:
         abort(401)
 
-    if auth.current_user(request) is None:
+    if auth.resolve_current_user(request) is None:
         abort(403)
 
-    request.current_user = auth.current_user(request)
-
 
 @app.errorhandler(404)
 def not_found(error) -> str:
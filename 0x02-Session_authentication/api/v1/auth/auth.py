@@ -2,7 +2,9 @@
 """Used to handle authetication"""
 from os import getenv
 from typing import List, TypeVar
-from flask import request
+from flask import g, has_request_context, request
+from api.v1.auth.path_matcher import ExcludedPathMatcher, \
+    compile_excluded_paths
 
 
 class Auth:
@@ -13,7 +15,7 @@ class Auth:
         Args:
             path (str): The path to check.
             excluded_paths (List[str]): A list of paths to
-            exclude from authentication.
+            exclude from authentication, or an ExcludedPathMatcher.
         Returns:
             bool: True if authentication is required, False otherwise.
         """
@@ -21,20 +23,12 @@ class Auth:
             return True
         if excluded_paths is None or len(excluded_paths) == 0:
             return True
+        if not isinstance(excluded_paths, ExcludedPathMatcher):
+            excluded_paths = compile_excluded_paths(tuple(excluded_paths))
         if path[-1] != '/':
             path += '/'
 
-        for excluded_path in excluded_paths:
-            if excluded_path.endswith('*'):
-                # Remove the wildcard character
-                base_excluded_path = excluded_path[:-1]
-                if path.startswith(base_excluded_path):
-                    return False
-            else:
-                if path == excluded_path:
-                    return False
-
-        return True
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """Authorization header"""
@@ -51,6 +45,21 @@ class Auth:
         """
         return None
 
+    def resolve_current_user(self, request=None):
+        """Current user, resolved at most once per request
+
+        Within a request context the result is kept on flask.g and
+        request.current_user, and reused by later calls and views.
+        """
+        if request is None:
+            return None
+        if not has_request_context():
+            return self.current_user(request)
+        if 'current_user' not in g:
+            g.current_user = self.current_user(request)
+        request.current_user = g.current_user
+        return g.current_user
+
     def session_cookie(self, request=None):
         """returns a cookie value from a request
 
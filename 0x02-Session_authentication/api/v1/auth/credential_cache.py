@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Module to cache verified Basic credentials"""
+from collections import OrderedDict
+from os import getenv, urandom
+from threading import Lock
+from time import monotonic
+from typing import Dict
+import hashlib
+import hmac
+from models.user import User
+
+CACHE_SIZE = int(getenv('BASIC_AUTH_CACHE_SIZE', '1024'))
+CACHE_TTL = float(getenv('BASIC_AUTH_CACHE_TTL', '60'))
+
+
+class CredentialCache:
+    """Bounded TTL cache from Authorization headers to user ids
+
+    Headers are only kept as an HMAC digest under a per-process key.
+    An entry also records the email and password hash it was verified
+    against, and is dropped when the user is gone or either changed.
+    """
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        """Initialize an empty cache"""
+        self.size = size
+        self.ttl = ttl
+        self._key = urandom(32)
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def digest(self, authorization_header: str) -> bytes:
+        """Keyed digest of an Authorization header"""
+        return hmac.new(self._key, authorization_header.encode('utf-8'),
+                        hashlib.sha256).digest()
+
+    def get(self, authorization_header: str) -> User:
+        """User cached for the header, or None on a miss"""
+        if self.size <= 0 or self.ttl <= 0:
+            return None
+        key = self.digest(authorization_header)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        user = None
+        if entry is not None:
+            user_id, email, password, expires_at = entry
+            if expires_at > monotonic():
+                user = User.get(user_id)
+            if user is None or user.email != email \
+                    or user.password != password:
+                user = None
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+        with self._lock:
+            if user is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return user
+
+    def put(self, authorization_header: str, user: User) -> None:
+        """Cache the user verified for the header"""
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        key = self.digest(authorization_header)
+        entry = (user.id, user.email, user.password,
+                 monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str = None) -> None:
+        """Drop the entries of user_id, or all entries"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                return
+            for key in [k for k, entry in self._entries.items()
+                        if entry[0] == user_id]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'size': len(self._entries)}
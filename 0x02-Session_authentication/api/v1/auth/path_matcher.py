@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Module to match paths excluded from authentication"""
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+_END = ''
+
+
+class ExcludedPathMatcher:
+    """Excluded paths compiled for constant-time lookups
+
+    Plain patterns go in a set and must equal the path; patterns ending
+    with '*' go in a character trie and match any path they prefix, so
+    a lookup costs one walk along the path whatever the pattern count.
+    """
+    def __init__(self, excluded_paths: Iterable[str] = ()):
+        """Compile excluded_paths"""
+        self.patterns: Tuple[str, ...] = tuple(excluded_paths)
+        self._exact = set()
+        self._prefixes = {}
+        for pattern in self.patterns:
+            if pattern.endswith('*'):
+                node = self._prefixes
+                for char in pattern[:-1]:
+                    node = node.setdefault(char, {})
+                node[_END] = True
+            else:
+                self._exact.add(pattern)
+
+    def __len__(self) -> int:
+        """Number of patterns"""
+        return len(self.patterns)
+
+    def match(self, path: str) -> bool:
+        """True if path is excluded"""
+        if path in self._exact:
+            return True
+        node = self._prefixes
+        if _END in node:
+            return True
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+
+@lru_cache(maxsize=32)
+def compile_excluded_paths(excluded_paths: Tuple[str, ...]
+                           ) -> ExcludedPathMatcher:
+    """Matcher of excluded_paths, compiled once per distinct tuple"""
+    return ExcludedPathMatcher(excluded_paths)
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """Session Auth Views"""
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request
 from models.user import User
 from os import getenv
 
@@ -18,15 +18,14 @@ def login():
         return jsonify({"error": "email missing"}), 400
     if not password:
         return jsonify({"error": "password missing"}), 400
-    users = User.search({"email": email})
-    if not users:
+    user = next(User.query({"email": email}, limit=1), None)
+    if user is None:
         return jsonify({"error": "no user found for this email"}), 404
-    user = users[0]
     if not user.is_valid_password(password):
         return jsonify({"error": "wrong password"}), 401
     from api.v1.app import auth
     session_id = auth.create_session(user.id)
-    response = jsonify(user.to_json())
+    response = Response(user.to_json_str(), mimetype='application/json')
     response.set_cookie(getenv('SESSION_NAME'), session_id)
     return response
 
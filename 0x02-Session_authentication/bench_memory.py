@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+""" Memory benchmark for the User store
+
+Loads N synthetic users with eager objects, lazy dicts and compact
+records, and prints the bytes DATA holds per user in each mode.
+"""
+from typing import List
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import models.base
+from bench_storage import make_users
+from models.user import User
+
+SIZES = (10000, 100000)
+MODES = (("objects", False, False), ("dicts", True, False),
+         ("compact", True, True))
+
+
+def run(sizes: List[int]):
+    """ Print bytes per user for each size and mode
+    """
+    print("{:>9} {:>8} {:>12}".format("users", "mode", "bytes/user"))
+    cwd = os.getcwd()
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                with open(".db_User.json", "w") as f:
+                    json.dump(make_users(count), f)
+                for name, lazy, compact in MODES:
+                    models.base.LAZY_LOAD = lazy
+                    models.base.COMPACT = compact
+                    models.base.DATA.pop("User", None)
+                    models.base.INDEXES.pop("User", None)
+                    gc.collect()
+                    tracemalloc.start()
+                    User.load_from_file()
+                    gc.collect()
+                    used, _ = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    print("{:>9} {:>8} {:>12.0f}".format(count, name,
+                                                         used / count))
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or list(SIZES))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Benchmark for Auth.require_auth
+
+Times require_auth against N excluded patterns (half exact, half '*'
+prefixes) with the patterns as a plain list, the way require_auth
+used to scan them, and as a compiled ExcludedPathMatcher.
+"""
+from typing import List
+import sys
+import timeit
+
+from api.v1.auth.auth import Auth
+from api.v1.auth.path_matcher import ExcludedPathMatcher
+
+SIZES = (4, 100, 500, 2000)
+NUMBER = 20000
+
+
+def make_patterns(count: int) -> List[str]:
+    """ Synthetic excluded paths
+    """
+    patterns = []
+    for i in range(count):
+        if i % 2:
+            patterns.append("/api/v1/public{}/*".format(i))
+        else:
+            patterns.append("/api/v1/static{}/".format(i))
+    return patterns
+
+
+def scan(path: str, excluded_paths: List[str]) -> bool:
+    """ The linear scan require_auth did before the matcher
+    """
+    if path[-1] != '/':
+        path += '/'
+    for excluded_path in excluded_paths:
+        if excluded_path.endswith('*'):
+            if path.startswith(excluded_path[:-1]):
+                return False
+        elif path == excluded_path:
+            return False
+    return True
+
+
+def run(sizes: List[int]):
+    """ Print microseconds per check for each size
+    """
+    auth = Auth()
+    path = "/api/v1/users/me"
+    print("{:>9} {:>10} {:>10}".format("patterns", "scan us", "matcher us"))
+    for count in sizes:
+        patterns = make_patterns(count)
+        matcher = ExcludedPathMatcher(patterns)
+        assert scan(path, patterns) == auth.require_auth(path, matcher)
+        linear = timeit.timeit(lambda: scan(path, patterns), number=NUMBER)
+        compiled = timeit.timeit(lambda: auth.require_auth(path, matcher),
+                                 number=NUMBER)
+        print("{:>9} {:>10.3f} {:>10.3f}".format(
+            count, linear / NUMBER * 1e6, compiled / NUMBER * 1e6))
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or list(SIZES))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+""" Startup benchmark for User.load_from_file
+
+Writes N synthetic users to a temporary directory, then times
+load_from_file and the first get/search in each snapshot format, with
+eager and lazy hydration.
+"""
+from typing import List
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import models.base
+from models.user import User
+
+SIZES = (10000, 100000, 1000000)
+MODES = (("json", False), ("json", True), ("marshal", True))
+
+
+def make_users(count: int) -> dict:
+    """ Serialized users, as stored in .db_User.json
+    """
+    users = {}
+    for i in range(count):
+        user_id = str(uuid.uuid4())
+        users[user_id] = {
+            "id": user_id,
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-01T00:00:00",
+            "email": "user{}@example.com".format(i),
+            "_password": "5e884898da28047151d0e56f8dc6292773603d0d6aabbdd6",
+            "first_name": "First{}".format(i % 100),
+            "last_name": "Last{}".format(i % 1000),
+        }
+    return users
+
+
+def timed(func) -> float:
+    """ Seconds taken by func()
+    """
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def run(sizes: List[int]):
+    """ Print load, first get and first search times per size and mode
+    """
+    print("{:>9} {:>8} {:>5} {:>9} {:>9} {:>9}".format(
+        "users", "format", "lazy", "load s", "get ms", "search ms"))
+    cwd = os.getcwd()
+    for count in sizes:
+        users = make_users(count)
+        some_id = next(reversed(users))
+        email = users[some_id]["email"]
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                with open(".db_User.json", "w") as f:
+                    json.dump(users, f)
+                for snapshot_format, lazy in MODES:
+                    models.base.SNAPSHOT_FORMAT = snapshot_format
+                    models.base.LAZY_LOAD = lazy
+                    if snapshot_format == "marshal" and \
+                            not os.path.exists(".db_User.marshal"):
+                        User.load_from_file()
+                        User.save_to_file()
+                    load = timed(User.load_from_file)
+                    get = timed(lambda: User.get(some_id))
+                    search = timed(lambda: User.search({"email": email}))
+                    print("{:>9} {:>8} {:>5} {:>9.2f} {:>9.3f} {:>9.3f}"
+                          .format(count, snapshot_format, str(lazy), load,
+                                  get * 1000, search * 1000))
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or list(SIZES))
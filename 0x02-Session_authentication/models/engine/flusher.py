@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Write-behind flusher module
+"""
+from typing import Dict, List
+import logging
+import threading
+
+
+class Flusher:
+    """
+    Collects mutation records per class and persists them from a
+    background thread, at most once per interval or as soon as
+    max_pending records are waiting
+    """
+
+    def __init__(self, interval: float, max_pending: int):
+        """
+        Initialize an idle flusher
+        """
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[type, List[dict]] = {}
+        self._count = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, cls: type, records: List[dict]) -> None:
+        """
+        Queue records for cls; cls._write(records) persists them later
+        """
+        with self._cond:
+            self._pending.setdefault(cls, []).extend(records)
+            self._count += len(records)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name="base-flusher",
+                                                daemon=True)
+                self._thread.start()
+            if self._count >= self.max_pending:
+                self._cond.notify()
+
+    def pending(self) -> int:
+        """
+        Number of records not yet persisted
+        """
+        with self._cond:
+            return self._count
+
+    def flush(self) -> None:
+        """
+        Persist everything queued so far, one write per class
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._count = 0
+            for cls, records in batch.items():
+                try:
+                    cls._write(records)
+                except Exception:
+                    logging.getLogger(__name__).exception(
+                        "Failed to persist %s", cls.__name__)
+                    with self._cond:
+                        queued = self._pending.get(cls, [])
+                        self._pending[cls] = records + queued
+                        self._count += len(records)
+
+    def _run(self) -> None:
+        """
+        Background loop
+        """
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._count >= self.max_pending,
+                    timeout=self.interval)
+            self.flush()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Secondary index module
+"""
+from typing import Dict, Hashable, List, Union
+
+
+class HashIndex:
+    """
+    Maps the values of one attribute to the ids of the objects holding them
+
+    A value held by a single object maps to its id alone; a dict of ids
+    is only built once a second object shares the value.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index
+        """
+        self._ids: Dict[Hashable, Union[str, Dict[str, None]]] = {}
+        self._values: Dict[str, Hashable] = {}
+        self._unhashable: Dict[str, None] = {}
+
+    def add(self, obj_id: str, value) -> None:
+        """
+        Index obj_id under value, replacing its previous entry
+        """
+        self.discard(obj_id)
+        try:
+            ids = self._ids.get(value)
+        except TypeError:
+            self._unhashable[obj_id] = None
+            return
+        if ids is None:
+            self._ids[value] = obj_id
+        elif type(ids) is str:
+            self._ids[value] = {ids: None, obj_id: None}
+        else:
+            ids[obj_id] = None
+        self._values[obj_id] = value
+
+    def discard(self, obj_id: str) -> None:
+        """
+        Remove obj_id from the index if present
+        """
+        self._unhashable.pop(obj_id, None)
+        if obj_id not in self._values:
+            return
+        value = self._values.pop(obj_id)
+        ids = self._ids[value]
+        if type(ids) is str:
+            del self._ids[value]
+            return
+        del ids[obj_id]
+        if len(ids) == 1:
+            self._ids[value] = next(iter(ids))
+
+    def lookup(self, value) -> List[str]:
+        """
+        Return a copy of the ids that may hold value, in insertion order
+        (raises TypeError if value is unhashable)
+        """
+        ids = self._ids.get(value, ())
+        ids = [ids] if type(ids) is str else list(ids)
+        if self._unhashable:
+            ids.extend(self._unhashable)
+        return ids
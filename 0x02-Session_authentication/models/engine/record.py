@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compact record module
+"""
+from typing import Callable, Dict, Iterable, List
+import calendar
+import sys
+import threading
+import time
+
+
+class Record(tuple):
+    """
+    Compact form of one stored object: its attribute values in the
+    column order of the Layout of its class, without the id
+    """
+    __slots__ = ()
+
+
+class Layout:
+    """
+    Column layout of the records of one class
+
+    Timestamps are kept as integer epoch seconds and the values of the
+    interned attributes go through sys.intern, so repeated strings are
+    stored once.
+    """
+
+    def __init__(self, parse: Callable, timestamp_format: str,
+                 timestamps: Iterable[str] = ('created_at', 'updated_at'),
+                 interned: Iterable[str] = ()):
+        """
+        Initialize an empty layout
+        """
+        self.columns: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._parse = parse
+        self._format = timestamp_format
+        self._timestamps = frozenset(timestamps)
+        self._interned = frozenset(interned)
+        self._lock = threading.Lock()
+
+    def _position(self, key: str) -> int:
+        """
+        Column of key, appended on first use
+        """
+        position = self._positions.get(key)
+        if position is None:
+            with self._lock:
+                position = self._positions.get(key)
+                if position is None:
+                    position = len(self.columns)
+                    self.columns.append(key)
+                    self._positions[key] = position
+        return position
+
+    def pack(self, obj_json: dict) -> Record:
+        """
+        Record of a serialized object (as from to_json(True))
+        """
+        values = []
+        for key, value in obj_json.items():
+            if key == 'id':
+                continue
+            position = self._position(key)
+            if position >= len(values):
+                values.extend([None] * (position + 1 - len(values)))
+            if type(value) is str:
+                if key in self._timestamps:
+                    value = calendar.timegm(
+                        self._parse(value).utctimetuple())
+                elif key in self._interned:
+                    value = sys.intern(value)
+            values[position] = value
+        while values and values[-1] is None:
+            values.pop()
+        return Record(values)
+
+    def unpack(self, record: Record, obj_id: str) -> dict:
+        """
+        Serialized object of a record
+        """
+        result = {'id': obj_id}
+        for key, value in zip(self.columns, record):
+            if key in self._timestamps and type(value) is int:
+                value = time.strftime(self._format, time.gmtime(value))
+            result[key] = value
+        for key in self.columns[len(record):]:
+            result[key] = None
+        return result
+
+    def value(self, record: Record, key: str):
+        """
+        Stored value of one attribute (epoch seconds for timestamps)
+        """
+        position = self._positions.get(key)
+        if position is None or position >= len(record):
+            return None
+        return record[position]
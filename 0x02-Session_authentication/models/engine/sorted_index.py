@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Sorted index module
+"""
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+BATCH_SIZE = 1000
+
+
+class _Top:
+    """
+    Sorts after any id, to bound a value from above
+    """
+
+    def __lt__(self, other) -> bool:
+        """
+        Never smaller
+        """
+        return False
+
+    def __gt__(self, other) -> bool:
+        """
+        Always greater
+        """
+        return True
+
+
+_TOP = _Top()
+
+
+class SortedIndex:
+    """
+    Keeps (value, id) pairs sorted, for ordered and range iteration
+    """
+
+    def __init__(self, entries: Iterable[Tuple] = ()):
+        """
+        Initialize the index from (value, id) pairs
+        """
+        self._entries: List[Tuple] = sorted(entries)
+        self._keys: Dict[str, Tuple] = {entry[1]: entry
+                                        for entry in self._entries}
+
+    def __len__(self) -> int:
+        """
+        Number of indexed ids
+        """
+        return len(self._entries)
+
+    def add(self, obj_id: str, value) -> None:
+        """
+        Index obj_id under value, replacing its previous entry
+        """
+        entry = (value, obj_id)
+        if self._keys.get(obj_id) == entry:
+            return
+        self.discard(obj_id)
+        insort(self._entries, entry)
+        self._keys[obj_id] = entry
+
+    def discard(self, obj_id: str) -> None:
+        """
+        Remove obj_id from the index if present
+        """
+        entry = self._keys.pop(obj_id, None)
+        if entry is None:
+            return
+        position = bisect_left(self._entries, entry)
+        if position < len(self._entries) \
+                and self._entries[position] == entry:
+            del self._entries[position]
+
+    def iter_after(self, after: Tuple = None,
+                   batch_size: int = BATCH_SIZE) -> Iterator[Tuple]:
+        """
+        Yield the (value, id) pairs greater than after, in order
+
+        Pairs are copied batch_size at a time and each batch resumes
+        from the last pair yielded, so the index may change meanwhile.
+        """
+        while True:
+            start = 0 if after is None else bisect_right(self._entries,
+                                                         after)
+            batch = self._entries[start:start + batch_size]
+            if not batch:
+                return
+            yield from batch
+            after = batch[-1]
+
+    def iter_range(self, low=None, high=None, reverse: bool = False,
+                   batch_size: int = BATCH_SIZE) -> Iterator[Tuple]:
+        """
+        Yield the (value, id) pairs with low <= value <= high (None for
+        no bound), ascending or, with reverse, descending; batched like
+        iter_after
+        """
+        entries = self._entries
+        if not reverse:
+            start = 0 if low is None else bisect_left(entries, (low,))
+            while True:
+                batch = entries[start:start + batch_size]
+                if not batch:
+                    return
+                for entry in batch:
+                    if high is not None and entry[0] > high:
+                        return
+                    yield entry
+                start = bisect_right(entries, batch[-1])
+        end = len(entries) if high is None \
+            else bisect_right(entries, (high, _TOP))
+        while True:
+            batch = entries[max(end - batch_size, 0):end]
+            if not batch:
+                return
+            for entry in reversed(batch):
+                if low is not None and entry[0] < low:
+                    return
+                yield entry
+            end = bisect_left(entries, batch[0])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+""" Multi-process stress check of the shared (BASE_SHARED=1) Base store
+
+Worker processes create, update and remove their own users in the same
+directory. Afterwards every worker must see the same users, and a fresh
+load must hold exactly the users each one kept, with their last update.
+Run it under the different BASE_PERSISTENCE settings; exits 1 on
+failure.
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+
+import models.base
+from models.user import User
+
+PROCESSES = 4
+OPERATIONS = 100
+
+
+def worker(seed: int, barrier, results):
+    """ Create, update and remove users, then report what is left
+    """
+    models.base.SHARED = True
+    rng = random.Random(seed)
+    mine = {}
+    try:
+        User.load_from_file()
+        for i in range(OPERATIONS):
+            action = rng.random()
+            if action < 0.5 or not mine:
+                user = User(email="p{}-{}@example.com".format(seed, i))
+                user.save()
+                mine[user.id] = user
+            elif action < 0.8:
+                user = User.get(rng.choice(list(mine)))
+                user.first_name = "n{}".format(i)
+                user.save()
+                mine[user.id] = user
+            else:
+                mine.pop(rng.choice(list(mine))).remove()
+        kept = {user_id: user.first_name for user_id, user in mine.items()}
+        barrier.wait()
+        seen = sorted(user.id for user in User.all())
+        results.put((seed, kept, seen, None))
+    except BaseException as e:
+        barrier.abort()
+        results.put((seed, {}, [], repr(e)))
+
+
+def run() -> bool:
+    """ Run the stress scenario in the current directory
+    """
+    models.base.SHARED = True
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(PROCESSES)
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(seed, barrier, results))
+               for seed in range(PROCESSES)]
+    for process in workers:
+        process.start()
+    reports = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+
+    errors = [error for _, _, _, error in reports if error]
+    expected = {}
+    for _, kept, _, _ in reports:
+        expected.update(kept)
+    for seed, _, seen, error in reports:
+        if not error and seen != sorted(expected):
+            errors.append("worker {} sees {} users, not {}".format(
+                seed, len(seen), len(expected)))
+    User.load_from_file()
+    loaded = {user.id: user.first_name for user in User.all()}
+    if loaded != expected:
+        errors.append("reloaded store differs")
+    for error in errors:
+        print(error)
+    print("{} users, {} errors".format(len(expected), len(errors)))
+    return not errors
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        sys.exit(0 if run() else 1)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+""" Multi-threaded stress check of the Base store
+
+Writer threads create, update and remove users while reader threads
+search, list and count them. Afterwards the file is reloaded and must
+hold exactly the users left in memory. Run it under the different
+BASE_PERSISTENCE / BASE_FLUSH_INTERVAL settings; exits 1 on failure.
+"""
+from typing import List
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import models.base
+from models.user import User
+
+WRITERS = 8
+READERS = 4
+OPERATIONS = 200
+
+
+def writer(seed: int, errors: List[BaseException]):
+    """ Create, update and remove users
+    """
+    rng = random.Random(seed)
+    mine = []
+    try:
+        for i in range(OPERATIONS):
+            action = rng.random()
+            if action < 0.5 or not mine:
+                user = User(email="w{}-{}@example.com".format(seed, i))
+                user.save()
+                mine.append(user)
+            elif action < 0.8:
+                user = rng.choice(mine)
+                user.first_name = "n{}".format(i)
+                user.save()
+            else:
+                mine.pop(rng.randrange(len(mine))).remove()
+    except BaseException as e:
+        errors.append(e)
+
+
+def reader(stop: threading.Event, errors: List[BaseException]):
+    """ Search, list and count until stopped
+    """
+    try:
+        while not stop.is_set():
+            for user in User.search({"email": "w0-1@example.com"}):
+                assert user.email == "w0-1@example.com"
+            User.all()
+            User.count()
+            time.sleep(0.001)
+    except BaseException as e:
+        errors.append(e)
+
+
+def run() -> bool:
+    """ Run the stress scenario in a temporary directory
+    """
+    errors = []
+    stop = threading.Event()
+    User.load_from_file()
+    writers = [threading.Thread(target=writer, args=(seed, errors))
+               for seed in range(WRITERS)]
+    readers = [threading.Thread(target=reader, args=(stop, errors))
+               for _ in range(READERS)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+    models.base.flush()
+
+    expected = {user.id: user.to_json(True) for user in User.all()}
+    User.load_from_file()
+    loaded = {user.id: user.to_json(True) for user in User.all()}
+    for user_id, user_json in expected.items():
+        found = User.search({"email": user_json["email"]})
+        if [u.id for u in found] != [user_id]:
+            errors.append(AssertionError("index mismatch for " + user_id))
+    if loaded != expected:
+        errors.append(AssertionError("reloaded store differs"))
+    for error in errors:
+        print("{}: {}".format(type(error).__name__, error))
+    print("{} users, {} errors".format(len(expected), len(errors)))
+    return not errors
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        sys.exit(0 if run() else 1)